@@ -4,16 +4,96 @@ GPS Web Tracker - Command Line Interface
 """
 
 import argparse
-import os
 import sys
-from gps_web_tracker import main
-from config import Config
 
-def create_parser():
-    """Create command line argument parser"""
+class OrderedChoices(frozenset):
+    """frozenset that iterates in the order its items were given
+
+    Membership tests stay hashed, while argparse's invalid-choice message
+    lists the choices in a fixed order instead of one that changes with
+    PYTHONHASHSEED.
+    """
+    __slots__ = ('_order',)
+
+    def __new__(cls, items):
+        items = tuple(dict.fromkeys(items))
+        choices = super().__new__(cls, items)
+        choices._order = items
+        return choices
+
+    def __iter__(self):
+        return iter(self._order)
+
+# Accepted --log-level values
+LOG_LEVELS = OrderedChoices(('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+
+class ConfigDefaultsHelpFormatter(argparse.RawDescriptionHelpFormatter):
+    """Help formatter that fills {SETTING} placeholders from Config
+
+    Config is only imported when help text is actually rendered, so
+    --version and argument errors don't need to evaluate config.py.
+    """
+
+    def _expand_help(self, action):
+        from config import Config
+        return super()._expand_help(action).format_map(vars(Config))
+
+def _add_gps_group(parser):
+    """Add GPS server options to the parser"""
+    gps_group = parser.add_argument_group('GPS Server Settings')
+    gps_group.add_argument('--gps-host', type=str,
+                          help='GPS data server hostname (default: {GPS_HOST})')
+    gps_group.add_argument('--gps-port', type=int,
+                          help='GPS data server port (default: {GPS_PORT})')
+
+def _add_web_group(parser):
+    """Add web server options to the parser"""
+    web_group = parser.add_argument_group('Web Server Settings')
+    web_group.add_argument('--web-host', type=str,
+                          help='Web server host (default: {WEB_HOST})')
+    web_group.add_argument('--web-port', type=int,
+                          help='Web server port (default: {WEB_PORT})')
+
+def _add_app_group(parser):
+    """Add application options to the parser"""
+    app_group = parser.add_argument_group('Application Settings')
+    app_group.add_argument('--target-sender', type=str,
+                          help='Track specific sender ID (IMEI/phone number)')
+    app_group.add_argument('--max-points', type=int,
+                          help='Maximum points per sender (default: {MAX_POINTS_PER_SENDER})')
+    app_group.add_argument('--log-level', choices=LOG_LEVELS, metavar='LEVEL',
+                          help='Logging level: DEBUG, INFO, WARNING or ERROR (default: {LOG_LEVEL})')
+
+# Option groups and the long options each of them defines
+OPTION_GROUPS = (
+    (('--gps-host', '--gps-port'), _add_gps_group),
+    (('--web-host', '--web-port'), _add_web_group),
+    (('--target-sender', '--max-points', '--log-level'), _add_app_group),
+)
+
+def _mentions(argv, options):
+    """Check whether argv refers to any of the given long options
+
+    Abbreviated options are matched the way argparse matches them, so
+    '--gps-h' still counts as a mention of '--gps-host'.
+    """
+    for arg in argv:
+        if arg.startswith('--'):
+            name = arg.split('=', 1)[0]
+            if any(option.startswith(name) for option in options):
+                return True
+    return False
+
+def create_parser(argv=None):
+    """Create command line argument parser
+
+    When argv is given and help isn't requested, only the option groups
+    that argv refers to are built. Options of skipped groups still
+    default to None on the parsed namespace.
+    """
     parser = argparse.ArgumentParser(
         description='GPS Web Tracker - Real-time GPS tracking web application',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
+        formatter_class=ConfigDefaultsHelpFormatter,
         epilog="""
 Examples:
   # Run with default settings
@@ -39,28 +119,13 @@ Environment Variables:
         """
     )
     
-    # GPS Server settings
-    gps_group = parser.add_argument_group('GPS Server Settings')
-    gps_group.add_argument('--gps-host', type=str,
-                          help=f'GPS data server hostname (default: {Config.GPS_HOST})')
-    gps_group.add_argument('--gps-port', type=int,
-                          help=f'GPS data server port (default: {Config.GPS_PORT})')
-    
-    # Web Server settings
-    web_group = parser.add_argument_group('Web Server Settings')
-    web_group.add_argument('--web-host', type=str,
-                          help=f'Web server host (default: {Config.WEB_HOST})')
-    web_group.add_argument('--web-port', type=int,
-                          help=f'Web server port (default: {Config.WEB_PORT})')
+    parser.set_defaults(gps_host=None, gps_port=None, web_host=None, web_port=None,
+                        target_sender=None, max_points=None, log_level=None)
     
-    # Application settings
-    app_group = parser.add_argument_group('Application Settings')
-    app_group.add_argument('--target-sender', type=str,
-                          help='Track specific sender ID (IMEI/phone number)')
-    app_group.add_argument('--max-points', type=int,
-                          help=f'Maximum points per sender (default: {Config.MAX_POINTS_PER_SENDER})')
-    app_group.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
-                          help=f'Logging level (default: {Config.LOG_LEVEL})')
+    full = argv is None or '-h' in argv or _mentions(argv, ('--help',))
+    for options, add_group in OPTION_GROUPS:
+        if full or _mentions(argv, options):
+            add_group(parser)
     
     # Utility commands
     parser.add_argument('--version', action='version', version='GPS Web Tracker 1.0.0')
@@ -71,61 +136,83 @@ Environment Variables:
 
 def apply_args_to_config(args):
     """Apply command line arguments to configuration"""
-    if args.gps_host:
-        os.environ['GPS_HOST'] = args.gps_host
-    if args.gps_port:
-        os.environ['GPS_PORT'] = str(args.gps_port)
-    if args.web_host:
-        os.environ['WEB_HOST'] = args.web_host
-    if args.web_port:
-        os.environ['WEB_PORT'] = str(args.web_port)
-    if args.target_sender:
-        os.environ['TARGET_SENDER'] = args.target_sender
-    if args.max_points:
-        os.environ['MAX_POINTS_PER_SENDER'] = str(args.max_points)
-    if args.log_level:
-        os.environ['LOG_LEVEL'] = args.log_level
+    from config import Config
+    
+    if args.gps_host is not None:
+        Config.GPS_HOST = args.gps_host
+    if args.gps_port is not None:
+        Config.GPS_PORT = args.gps_port
+    if args.web_host is not None:
+        Config.WEB_HOST = args.web_host
+    if args.web_port is not None:
+        Config.WEB_PORT = args.web_port
+    if args.target_sender is not None:
+        Config.TARGET_SENDER = args.target_sender
+    if args.max_points is not None:
+        Config.MAX_POINTS_PER_SENDER = args.max_points
+    if args.log_level is not None:
+        Config.LOG_LEVEL = args.log_level
 
 def check_config():
     """Check and display current configuration"""
-    print("GPS Web Tracker Configuration")
-    print("=" * 40)
-    print(f"GPS Server:   {Config.GPS_HOST}:{Config.GPS_PORT}")
-    print(f"Web Server:   {Config.WEB_HOST}:{Config.WEB_PORT}")
-    print(f"Target Sender: {Config.TARGET_SENDER or 'All senders'}")
-    print(f"Max Points:   {Config.MAX_POINTS_PER_SENDER}")
-    print(f"Database:     {Config.DATABASE_PATH}")
-    print(f"Log Level:    {Config.LOG_LEVEL}")
-    print(f"Auto Refresh: {Config.AUTO_REFRESH}")
+    from config import Config
     
     try:
         Config.validate()
-        print("\n✓ Configuration is valid")
-        return True
+        status = "✓ Configuration is valid"
+        valid = True
     except ValueError as e:
-        print(f"\n❌ Configuration error: {e}")
-        return False
+        status = f"❌ Configuration error: {e}"
+        valid = False
+    
+    # Write the whole report at once instead of one print() per line
+    lines = [
+        "GPS Web Tracker Configuration",
+        "=" * 40,
+        f"GPS Server:   {Config.GPS_HOST}:{Config.GPS_PORT}",
+        f"Web Server:   {Config.WEB_HOST}:{Config.WEB_PORT}",
+        f"Target Sender: {Config.TARGET_SENDER or 'All senders'}",
+        f"Max Points:   {Config.MAX_POINTS_PER_SENDER}",
+        f"Database:     {Config.DATABASE_PATH}",
+        f"Log Level:    {Config.LOG_LEVEL}",
+        f"Auto Refresh: {Config.AUTO_REFRESH}",
+        "",
+        status,
+    ]
+    sys.stdout.write("\n".join(lines) + "\n")
+    return valid
 
-if __name__ == '__main__':
-    parser = create_parser()
-    args = parser.parse_args()
+def main():
+    """Parse command line arguments and launch the tracker"""
+    argv = sys.argv[1:]
     
-    # Apply command line arguments to environment
-    apply_args_to_config(args)
+    # Plain "just run it" invocations don't need argparse at all
+    if argv:
+        args = create_parser(argv).parse_args(argv)
+        
+        # Apply command line arguments to configuration
+        apply_args_to_config(args)
+        
+        # Handle utility commands
+        if args.check_config:
+            if check_config():
+                sys.exit(0)
+            else:
+                sys.exit(1)
     
-    # Handle utility commands
-    if args.check_config:
-        if check_config():
-            sys.exit(0)
-        else:
-            sys.exit(1)
+    # Import the web stack only once we know it is needed, so --help,
+    # --version and --check-config don't pay for Flask and Folium
+    from gps_web_tracker import main as run_tracker
     
     # Run the main application
     try:
-        main()
+        run_tracker()
     except KeyboardInterrupt:
         print("\n🛑 Application interrupted by user")
         sys.exit(0)
     except Exception as e:
         print(f"❌ Fatal error: {e}")
         sys.exit(1)
+
+if __name__ == '__main__':
+    main()
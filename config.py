@@ -3,21 +3,31 @@ Configuration settings for GPS Web Tracker
 """
 import os
 
+def _int_env(name, default):
+    """Read an integer setting, using default when the variable is unset"""
+    value = os.environ.get(name)
+    return int(value) if value is not None else default
+
+def _bool_env(name, default):
+    """Read a boolean setting ('true' in any case), using default when unset"""
+    value = os.environ.get(name)
+    return value.lower() == 'true' if value is not None else default
+
 class Config:
     """Application configuration"""
     
     # GPS Data Server Settings
     GPS_HOST = os.environ.get('GPS_HOST', 'localhost')
-    GPS_PORT = int(os.environ.get('GPS_PORT', 2223))
+    GPS_PORT = _int_env('GPS_PORT', 2223)
     
     # Web Server Settings
     WEB_HOST = os.environ.get('WEB_HOST', '0.0.0.0')
-    WEB_PORT = int(os.environ.get('WEB_PORT', 5000))
+    WEB_PORT = _int_env('WEB_PORT', 5000)
     
     # Application Settings
     TARGET_SENDER = os.environ.get('TARGET_SENDER', None)
-    MAX_POINTS_PER_SENDER = int(os.environ.get('MAX_POINTS_PER_SENDER', 1000))
-    AUTO_REFRESH = os.environ.get('AUTO_REFRESH', 'True').lower() == 'true'
+    MAX_POINTS_PER_SENDER = _int_env('MAX_POINTS_PER_SENDER', 1000)
+    AUTO_REFRESH = _bool_env('AUTO_REFRESH', True)
     
     # Database Settings
     DATABASE_PATH = os.environ.get('DATABASE_PATH', 'gps_tracking.db')
@@ -28,13 +38,21 @@ class Config:
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     
+    # Integer settings checked by validate(), as (name, minimum, maximum or None)
+    _SPEC = (
+        ('GPS_PORT', 1, 65535),
+        ('WEB_PORT', 1, 65535),
+        ('MAX_POINTS_PER_SENDER', 1, None),
+    )
+    
     @classmethod
     def validate(cls):
         """Validate configuration settings"""
-        if cls.GPS_PORT < 1 or cls.GPS_PORT > 65535:
-            raise ValueError("GPS_PORT must be between 1 and 65535")
-        if cls.WEB_PORT < 1 or cls.WEB_PORT > 65535:
-            raise ValueError("WEB_PORT must be between 1 and 65535")
-        if cls.MAX_POINTS_PER_SENDER < 1:
-            raise ValueError("MAX_POINTS_PER_SENDER must be greater than 0")
+        for name, low, high in cls._SPEC:
+            value = getattr(cls, name)
+            if high is None:
+                if value < low:
+                    raise ValueError(f"{name} must be greater than {low - 1}")
+            elif not low <= value <= high:
+                raise ValueError(f"{name} must be between {low} and {high}")
         return True
@@ -1,22 +1,282 @@
 import socket
 import xml.etree.ElementTree as ET
 import threading
+import functools
+import queue
 import time
 from datetime import datetime, timedelta
 import json
+import html
+import math
 import folium
 from folium import plugins
 import os
 import sqlite3
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import islice
 import logging
 import sys
 from flask import Flask, render_template, jsonify, request, send_file
+from flask.json.provider import JSONProvider
 from flask_socketio import SocketIO, emit
 import tempfile
 from typing import Optional
+from jinja2 import Template
+from jinja2.utils import htmlsafe_json_dumps
 from config import Config
 
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module is used without it
+    orjson = None
+
+INSERT_SQL = '''
+    INSERT INTO gps_points
+    (sender, sender_type, latitude, longitude, altitude, speed, course,
+     timestamp, gps_time, fix_type, satellites, emergency, protocol)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Group commit limits for the database writer thread
+WRITE_BATCH_SIZE = 200  # points
+WRITE_BATCH_DELAY = 0.1  # seconds
+
+# Track colors, handed out to senders in the order they are first seen
+SENDER_COLORS = ('red', 'blue', 'green', 'purple', 'orange', 'darkred',
+                 'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue',
+                 'darkpurple', 'white', 'pink', 'lightblue', 'lightgreen',
+                 'gray', 'black', 'lightgray')
+
+# Number of recent altitude readings the altitude trend is taken over
+ALTITUDE_WINDOW = 5
+
+# Altitude change across the window (meters) that counts as rising or falling
+TREND_THRESHOLD = 5.0
+TREND_LABELS = ('falling', 'stable', 'rising')
+
+class AltitudeWindow:
+    """The last ALTITUDE_WINDOW altitude readings of one sender
+    
+    Each reading except the newest is replaced by the median of itself and
+    its two raw neighbours once the next reading arrives, so a single GPS
+    altitude spike drops out of the trend as soon as it is followed by a
+    normal reading. Monotonic climbs and descents pass through unchanged.
+    
+    Readings are numbered in arrival order, and the sums behind their
+    least-squares slope are adjusted as readings enter, change and leave
+    the window, so the slope never needs a pass over the readings.
+    """
+    # Renumber the readings from 0 once the numbering gets this far, so
+    # sum_talt neither grows large nor collects rounding error indefinitely
+    REBASE_AT = 4096
+    
+    __slots__ = ('readings', 'prev_raw', 'next_t', 'sum_t', 'sum_t2', 'sum_alt', 'sum_talt')
+    
+    def __init__(self, altitudes=()):
+        self.readings = deque()  # (t, altitude), oldest first; the newest is raw
+        self.prev_raw = None  # raw value of the reading before the newest
+        self._reset_sums()
+        for altitude in altitudes:
+            self.append(altitude)
+    
+    def __len__(self):
+        return len(self.readings)
+    
+    def _reset_sums(self):
+        self.next_t = 0
+        self.sum_t = 0
+        self.sum_t2 = 0
+        self.sum_alt = 0.0
+        self.sum_talt = 0.0
+    
+    def _add(self, t, altitude):
+        self.sum_t += t
+        self.sum_t2 += t * t
+        self.sum_alt += altitude
+        self.sum_talt += t * altitude
+    
+    def _remove(self, t, altitude):
+        self.sum_t -= t
+        self.sum_t2 -= t * t
+        self.sum_alt -= altitude
+        self.sum_talt -= t * altitude
+    
+    def append(self, altitude):
+        """Add the newest reading, dropping the oldest when the window is full
+        
+        Non-finite readings are ignored; once in the running sums, they
+        could never be subtracted out again.
+        """
+        if not math.isfinite(altitude):
+            return
+        if self.readings:
+            # The previous newest reading now has both neighbours
+            t, latest = self.readings[-1]
+            if self.prev_raw is not None:
+                filtered = sorted((self.prev_raw, latest, altitude))[1]
+                self.readings[-1] = (t, filtered)
+                self.sum_alt += filtered - latest
+                self.sum_talt += t * (filtered - latest)
+            self.prev_raw = latest
+        if len(self.readings) == ALTITUDE_WINDOW:
+            t, old = self.readings.popleft()
+            self._remove(t, old)
+        if self.next_t == self.REBASE_AT:
+            altitudes = [alt for _, alt in self.readings]
+            self.readings.clear()
+            self._reset_sums()
+            for alt in altitudes:
+                self.readings.append((self.next_t, alt))
+                self._add(self.next_t, alt)
+                self.next_t += 1
+        t = self.next_t
+        self.next_t += 1
+        self.readings.append((t, altitude))
+        self._add(t, altitude)
+    
+    def change(self):
+        """Least-squares altitude change across the window (needs 2+ readings)"""
+        n = len(self.readings)
+        slope = ((n * self.sum_talt - self.sum_t * self.sum_alt)
+                 / (n * self.sum_t2 - self.sum_t * self.sum_t))
+        return slope * (n - 1)
+
+def _trend_of(summary):
+    """Altitude trend part of a sender summary"""
+    return {
+        'current_altitude': summary['altitude'],
+        'trend': summary['altitude_trend'],
+        'change': summary['altitude_change']
+    }
+
+def _json_number(value):
+    """JSON text for an optional float (null for None, NaN and infinities)"""
+    return repr(value) if value is not None and math.isfinite(value) else 'null'
+
+# Body of /api/trends/<sender>; the trend is always one of TREND_LABELS,
+# so it needs no escaping
+TREND_JSON = '{"current_altitude":%s,"trend":"%s","change":%s}'
+
+def _recent_altitudes(points):
+    """Window of the last ALTITUDE_WINDOW altitude readings in points
+    
+    One extra reading is fed in first, so the oldest reading in the window
+    is median filtered just as it would have been when the points arrived.
+    """
+    readings = (point.get('altitude') for point in reversed(points))
+    recent = islice((alt for alt in readings if alt is not None and math.isfinite(alt)),
+                    ALTITUDE_WINDOW + 1)
+    return AltitudeWindow(reversed(list(recent)))
+
+# GPS report elements understood by parse_gps_data
+REPORT_TYPES = frozenset((
+    'nalGpsReport3', 'nalGpsReport4', 'nalGpsReport5',
+    'nalGpsReport6', 'nalGpsReport7', 'nal10ByteGpsReport0',
+    'pecosP3GpsReport', 'pecosP4GpsReport'
+))
+
+# Report types that carry several <point> children instead of one fix
+MULTI_POINT_REPORTS = frozenset(('nalGpsReport3', 'nalGpsReport4'))
+
+def _flag(text):
+    """Parse a '0'/'1' report flag"""
+    return text == '1'
+
+def _finite_float(text):
+    """Parse a number, rejecting the 'nan' and 'inf' spellings float() accepts"""
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"non-finite value: {text}")
+    return value
+
+# Optional report fields, as XML tag -> (GPS point key, parser or None for raw text)
+OPTIONAL_FIELDS = {
+    'alt': ('altitude', _finite_float),
+    'gndVel': ('speed', _finite_float),
+    'course': ('course', _finite_float),
+    'time': ('gps_time', None),
+    'fix': ('fix_type', None),
+    'sats': ('satellites', int),
+    'emer': ('emergency', _flag)
+}
+
+def _orjson_dumps(obj):
+    """Encode obj to JSON bytes with orjson, stringifying non-str keys like json does"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+class OrjsonCodec:
+    """json module stand-in backed by orjson, for Socket.IO packet encoding
+    
+    Socket.IO calls dumps() with stdlib keyword arguments such as
+    separators and expects a str back; orjson output is always compact
+    and comes back as bytes.
+    """
+    
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return _orjson_dumps(obj).decode()
+    
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, for jsonify() responses
+    
+    Responses are built straight from orjson's bytes, without decoding
+    them to str first. Keys are not sorted, unlike Flask's default provider.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        return _orjson_dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_orjson_dumps(obj), mimetype='application/json')
+
+class TrackLayer(folium.MacroElement):
+    """Draws the map view, tracks and markers from one JSON document
+    
+    The document has 'center', 'zoom', 'tracks' ([sender, color, coords]
+    rows) and 'markers' ([lat, lng, color, icon, popup_html, tooltip] rows).
+    It is not part of the template: the rendered script ends in
+    DATA_PLACEHOLDER, which is swapped for the document of each render, so
+    the map shell around it only has to be rendered once.
+    """
+    DATA_PLACEHOLDER = '/*MAP_DATA*/'
+    
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            (function (data) {
+                var map = {{ this._parent.get_name() }};
+                map.setView(data.center, data.zoom);
+                data.tracks.forEach(function (t) {
+                    L.polyline(t[2], {color: t[1], weight: 3, opacity: 0.7})
+                    .bindPopup('<div style="width: 100.0%; height: 100.0%;">Track for ' + t[0] + '</div>', {maxWidth: '100%'})
+                    .addTo(map);
+                });
+                data.markers.forEach(function (m) {
+                    L.marker([m[0], m[1]], {
+                        icon: L.AwesomeMarkers.icon({
+                            markerColor: m[2], iconColor: 'white', icon: m[3],
+                            prefix: 'glyphicon', extraClasses: 'fa-rotate-0'
+                        })
+                    })
+                    .bindPopup('<div style="width: 100.0%; height: 100.0%;">' + m[4] + '</div>', {maxWidth: 300})
+                    .bindTooltip('<div>' + m[5] + '</div>', {sticky: true})
+                    .addTo(map);
+                });
+            })({{ this.DATA_PLACEHOLDER }});
+        {% endmacro %}
+    """)
+    
+    def __init__(self):
+        super().__init__()
+        self._name = 'TrackLayer'
+
 class GPSWebTracker:
     def __init__(self, host=None, port=None, target_sender=None):
         """
@@ -36,9 +296,25 @@ class GPSWebTracker:
         self.running = False
         
         # Data storage
-        self.gps_data = defaultdict(list)  # sender -> list of GPS points
+        # sender -> deque of GPS points, oldest evicted once max_points_per_sender is hit
+        self.gps_data = defaultdict(lambda: deque(maxlen=self.max_points_per_sender))
         self.latest_positions = {}  # sender -> latest position
+        self.sender_colors = {}  # sender -> track color, stable for the whole run
+        self.sender_summaries = {}  # sender -> summary, rebuilt when the sender gets points
+        # sender -> last ALTITUDE_WINDOW altitude readings, for the altitude trend
+        self._alt_window = defaultdict(AltitudeWindow)
         self.data_lock = threading.Lock()
+        self.data_version = 0  # bumped whenever new points are stored
+        
+        # Running coordinate totals over everything in gps_data, so the
+        # average map center doesn't need a pass over every point
+        self.lat_sum = 0.0
+        self.lng_sum = 0.0
+        self.point_count = 0
+        
+        # Rendered maps, keyed by (data_version, center_on_latest)
+        self._render_map = functools.lru_cache(maxsize=4)(self._render_map_impl)
+        self._map_shell_html = None  # see _map_shell
         
         # Map settings
         self.auto_refresh = Config.AUTO_REFRESH
@@ -53,6 +329,10 @@ class GPSWebTracker:
         
         # Database and web app components
         self.db_path = Config.DATABASE_PATH
+        self.db: Optional[sqlite3.Connection] = None  # persistent connection
+        self.db_lock = threading.Lock()
+        self.write_queue = queue.SimpleQueue()  # point batches for the writer thread
+        self.writer_thread: Optional[threading.Thread] = None
         self.app: Optional[Flask] = None
         self.socketio: Optional[SocketIO] = None
         self.listen_thread: Optional[threading.Thread] = None
@@ -61,9 +341,21 @@ class GPSWebTracker:
         self.load_historical_data()
         
     def init_database(self):
-        """Initialize SQLite database for storing GPS data"""
+        """Initialize SQLite database for storing GPS data
+        
+        Opens the single connection that the listener and the web handlers
+        share for the lifetime of the tracker. Access it under self.db_lock.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            
+            # WAL lets web reads proceed while the listener writes, and makes
+            # synchronous=NORMAL safe, so commits skip the per-commit fsync
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-20000')
+            
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -86,45 +378,53 @@ class GPSWebTracker:
                 )
             ''')
             
+            # Lookups by sender use the leading column of idx_sender_timestamp;
+            # a separate sender index would only slow down every insert
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_sender ON gps_points(sender)
+                DROP INDEX IF EXISTS idx_sender
             ''')
             
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_timestamp ON gps_points(timestamp)
             ''')
             
-            conn.commit()
-            conn.close()
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sender_timestamp ON gps_points(sender, timestamp)
+            ''')
+            
+            self.db = conn
             self.logger.info(f"Database initialized: {self.db_path}")
         except Exception as e:
             self.logger.error(f"Database initialization error: {e}")
 
     def load_historical_data(self):
-        """Load existing GPS data from database into memory"""
+        """Load existing GPS data from database into memory
+        
+        Only the newest max_points_per_sender rows of each sender are read,
+        using an index seek per sender rather than a scan of the whole table.
+        Listing the senders still scans idx_sender_timestamp, which is much
+        cheaper than reading the rows but does grow with the table.
+        """
+        if self.db is None:
+            return
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT sender, sender_type, latitude, longitude, altitude, speed, course,
-                       timestamp, gps_time, fix_type, satellites, emergency, protocol
-                FROM gps_points
-                ORDER BY sender, timestamp
-            ''')
-            rows = cursor.fetchall()
-            current_sender = None
-            points_for_sender = []
-            for row in rows:
-                sender = row[0]
-                if current_sender != sender:
-                    if current_sender and points_for_sender:
-                        if len(points_for_sender) > self.max_points_per_sender:
-                            points_for_sender = points_for_sender[-self.max_points_per_sender:]
-                        self.gps_data[current_sender] = points_for_sender
-                        self.latest_positions[current_sender] = points_for_sender[-1]
-                    current_sender = sender
-                    points_for_sender = []
-                point = {
+            with self.db_lock:
+                senders = [row[0] for row in self.db.execute('SELECT DISTINCT sender FROM gps_points')]
+                rows_by_sender = {
+                    sender: self.db.execute('''
+                        SELECT sender, sender_type, latitude, longitude, altitude, speed, course,
+                               timestamp, gps_time, fix_type, satellites, emergency, protocol
+                        FROM gps_points
+                        WHERE sender = ?
+                        ORDER BY timestamp DESC, id DESC
+                        LIMIT ?
+                    ''', (sender, self.max_points_per_sender)).fetchall()
+                    for sender in senders
+                }
+            for sender, rows in rows_by_sender.items():
+                if not rows:
+                    continue
+                points_for_sender = [{
                     'sender': row[0],
                     'sender_type': row[1],
                     'lat': row[2],
@@ -138,14 +438,17 @@ class GPSWebTracker:
                     'satellites': row[10],
                     'emergency': bool(row[11]) if row[11] is not None else False,
                     'protocol': row[12]
-                }
-                points_for_sender.append(point)
-            if current_sender and points_for_sender:
-                if len(points_for_sender) > self.max_points_per_sender:
-                    points_for_sender = points_for_sender[-self.max_points_per_sender:]
-                self.gps_data[current_sender] = points_for_sender
-                self.latest_positions[current_sender] = points_for_sender[-1]
-            conn.close()
+                } for row in reversed(rows)]
+                self.gps_data[sender] = deque(points_for_sender, maxlen=self.max_points_per_sender)
+                self.latest_positions[sender] = points_for_sender[-1]
+                self._assign_color(sender)
+                self._alt_window[sender] = _recent_altitudes(points_for_sender)
+                self.sender_summaries[sender] = self._summary_for(sender)
+            for points in self.gps_data.values():
+                for point in points:
+                    self.lat_sum += point['lat']
+                    self.lng_sum += point['lng']
+                self.point_count += len(points)
             if self.gps_data:
                 self.logger.info(f"Loaded historical data for {len(self.gps_data)} senders from database")
         except Exception as e:
@@ -170,6 +473,11 @@ class GPSWebTracker:
         if self.listen_thread and self.listen_thread.is_alive():
             self.logger.info("Waiting for listen thread to finish...")
             self.listen_thread.join(timeout=5)
+        self._stop_writer()
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
         if self.socket:
             try:
                 self.socket.shutdown(socket.SHUT_RDWR)
@@ -183,7 +491,10 @@ class GPSWebTracker:
             self.logger.info("Disconnected from Data Server")
     
     def parse_gps_data(self, xml_data):
-        """Parse GPS data from Server for Trackers XML format"""
+        """Parse GPS data from Server for Trackers XML format
+        
+        xml_data may be str or UTF-8 encoded bytes as received from the socket.
+        """
         try:
             root = ET.fromstring(xml_data)
             
@@ -213,29 +524,22 @@ class GPSWebTracker:
             # Parse GPS reports
             gps_points = []
             
-            # Handle different GPS report types
-            report_types = [
-                'nalGpsReport3', 'nalGpsReport4', 'nalGpsReport5', 
-                'nalGpsReport6', 'nalGpsReport7', 'nal10ByteGpsReport0',
-                'pecosP3GpsReport', 'pecosP4GpsReport'
-            ]
-            
-            for report_type in report_types:
-                report = root.find(report_type)
-                if report is not None:
-                    if report_type in ['nalGpsReport3', 'nalGpsReport4']:
-                        # Multiple points possible
-                        points = report.findall('point')
-                        for point in points:
-                            gps_point = self._extract_gps_point(point, sender, sender_type, timestamp, protocol)
-                            if gps_point:
-                                gps_points.append(gps_point)
-                    else:
-                        # Single point
-                        gps_point = self._extract_gps_point(report, sender, sender_type, timestamp, protocol)
+            # Find the report in a single pass over the message's children
+            for report in root:
+                if report.tag not in REPORT_TYPES:
+                    continue
+                if report.tag in MULTI_POINT_REPORTS:
+                    # Multiple points possible
+                    for point in report.findall('point'):
+                        gps_point = self._extract_gps_point(point, sender, sender_type, timestamp, protocol)
                         if gps_point:
                             gps_points.append(gps_point)
-                    break
+                else:
+                    # Single point
+                    gps_point = self._extract_gps_point(report, sender, sender_type, timestamp, protocol)
+                    if gps_point:
+                        gps_points.append(gps_point)
+                break
             
             return gps_points
             
@@ -246,14 +550,14 @@ class GPSWebTracker:
     def _extract_gps_point(self, element, sender, sender_type, timestamp, protocol):
         """Extract GPS point data from XML element"""
         try:
-            lat_elem = element.find('lat')
-            lng_elem = element.find('lng')
+            # Collect all child fields at once instead of one find() per field
+            fields = {child.tag: child.text for child in element}
             
-            if lat_elem is None or lng_elem is None:
+            if 'lat' not in fields or 'lng' not in fields:
                 return None
                 
-            lat = float(lat_elem.text)
-            lng = float(lng_elem.text)
+            lat = float(fields['lat'])
+            lng = float(fields['lng'])
             
             # Validate coordinates
             if not (-90 <= lat <= 90 and -180 <= lng <= 180):
@@ -269,34 +573,20 @@ class GPSWebTracker:
                 'protocol': protocol
             }
             
-            # Extract optional fields
-            optional_fields = {
-                'alt': 'altitude',
-                'gndVel': 'speed', 
-                'course': 'course',
-                'time': 'gps_time',
-                'fix': 'fix_type',
-                'sats': 'satellites',
-                'emer': 'emergency'
-            }
-            
-            for xml_field, db_field in optional_fields.items():
-                elem = element.find(xml_field)
-                if elem is not None:
-                    if xml_field in ['alt', 'gndVel', 'course']:
-                        try:
-                            gps_point[db_field] = float(elem.text)
-                        except (ValueError, TypeError):
-                            pass
-                    elif xml_field == 'sats':
-                        try:
-                            gps_point[db_field] = int(elem.text)
-                        except (ValueError, TypeError):
-                            pass
-                    elif xml_field == 'emer':
-                        gps_point[db_field] = elem.text == '1'
-                    else:
-                        gps_point[db_field] = elem.text
+            # Extract optional fields, visiting only the tags that are present;
+            # a field that fails to parse is left out
+            for xml_field, text in fields.items():
+                field = OPTIONAL_FIELDS.get(xml_field)
+                if field is None:
+                    continue
+                db_field, parse = field
+                if parse is None:
+                    gps_point[db_field] = text
+                    continue
+                try:
+                    gps_point[db_field] = parse(text)
+                except (ValueError, TypeError):
+                    pass
             
             return gps_point
             
@@ -313,59 +603,157 @@ class GPSWebTracker:
             for point in gps_points:
                 sender = point['sender']
                 
-                # Add to memory storage
-                self.gps_data[sender].append(point)
-                
-                # Limit points per sender
-                if len(self.gps_data[sender]) > self.max_points_per_sender:
-                    self.gps_data[sender] = self.gps_data[sender][-self.max_points_per_sender:]
+                # Add to memory storage (the deque drops the oldest point when full)
+                points = self.gps_data[sender]
+                if len(points) == points.maxlen:
+                    evicted = points[0]
+                    self.lat_sum -= evicted['lat']
+                    self.lng_sum -= evicted['lng']
+                    self.point_count -= 1
+                points.append(point)
+                self.lat_sum += point['lat']
+                self.lng_sum += point['lng']
+                self.point_count += 1
+                if point.get('altitude') is not None:
+                    self._alt_window[sender].append(point['altitude'])
                 
                 # Update latest position
                 self.latest_positions[sender] = point
+                self._assign_color(sender)
+            
+            self.data_version += 1
+            
+            # Only the senders in this batch changed, so only summarize those
+            sender_delta = {}
+            for sender in {point['sender'] for point in gps_points}:
+                summary = self._summary_for(sender)
+                self.sender_summaries[sender] = sender_delta[sender] = summary
         
-        # Store in database
-        self._store_to_database(gps_points)
+        # Store in database (written by the writer thread in group commits)
+        self._queue_for_database(gps_points)
         
-        # Emit real-time updates to web clients
+        # Emit real-time updates to web clients; they merge sender_delta
+        # into the summary they already hold
         if self.socketio:
             self.socketio.emit('gps_update', {
                 'points': gps_points,
-                'sender_summary': self.get_sender_summary()
+                'sender_delta': sender_delta
             })
         
         self.logger.info(f"Stored {len(gps_points)} GPS points")
     
+    def _assign_color(self, sender):
+        """Give a newly seen sender the next track color"""
+        if sender not in self.sender_colors:
+            self.sender_colors[sender] = SENDER_COLORS[len(self.sender_colors) % len(SENDER_COLORS)]
+    
+    def _queue_for_database(self, gps_points):
+        """Hand GPS points to the database writer thread, starting it if needed"""
+        if self.writer_thread is None or not self.writer_thread.is_alive():
+            self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self.writer_thread.start()
+        self.write_queue.put(gps_points)
+    
+    def _writer_loop(self):
+        """Write queued GPS points to the database in group commits
+        
+        Batches are gathered until WRITE_BATCH_SIZE points are pending or
+        WRITE_BATCH_DELAY seconds have passed, then written in a single
+        transaction. A None item flushes pending points and stops the loop.
+        """
+        stop = False
+        while not stop:
+            batch = self.write_queue.get()
+            if batch is None:
+                break
+            batches = [batch]  # kept apart so a rejected one can be isolated
+            pending = len(batch)
+            deadline = time.monotonic() + WRITE_BATCH_DELAY
+            while pending < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch = self.write_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stop = True
+                    break
+                batches.append(batch)
+                pending += len(batch)
+            try:
+                self._write_batches(batches)
+            except Exception as e:
+                # Losing this group is bad, losing the writer thread is worse
+                self.logger.error(f"Database writer error: {e}")
+    
+    def _write_batches(self, batches):
+        """Write queued batches in one transaction
+        
+        If the group insert fails, each batch is retried in its own
+        transaction, so a rejected message only loses its own points and a
+        transient error (such as a locked database) is retried.
+        """
+        if len(batches) > 1:
+            try:
+                self._insert_points([point for batch in batches for point in batch])
+                return
+            except sqlite3.Error as e:
+                self.logger.warning(f"Group commit failed ({e}), writing batches one by one")
+        for batch in batches:
+            self._store_to_database(batch)
+    
+    def _stop_writer(self):
+        """Flush queued GPS points to the database and stop the writer thread"""
+        if self.writer_thread and self.writer_thread.is_alive():
+            self.write_queue.put(None)
+            self.writer_thread.join(timeout=5)
+        self.writer_thread = None
+    
     def _store_to_database(self, gps_points):
         """Store GPS points to SQLite database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for point in gps_points:
-                cursor.execute('''
-                    INSERT INTO gps_points 
-                    (sender, sender_type, latitude, longitude, altitude, speed, course, 
-                     timestamp, gps_time, fix_type, satellites, emergency, protocol)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    point['sender'], point.get('sender_type'),
-                    point['lat'], point['lng'], 
-                    point.get('altitude'), point.get('speed'), point.get('course'),
-                    point['timestamp'], point.get('gps_time'), point.get('fix_type'),
-                    point.get('satellites'), point.get('emergency', False), point.get('protocol')
-                ))
-            
-            conn.commit()
-            conn.close()
+            self._insert_points(gps_points)
         except Exception as e:
             self.logger.error(f"Database storage error: {e}")
     
+    def _insert_points(self, gps_points):
+        """Insert GPS points in one transaction, rolling back on any error"""
+        rows = [(
+            point['sender'], point.get('sender_type'),
+            point['lat'], point['lng'],
+            point.get('altitude'), point.get('speed'), point.get('course'),
+            point['timestamp'], point.get('gps_time'), point.get('fix_type'),
+            point.get('satellites'), point.get('emergency', False), point.get('protocol')
+        ) for point in gps_points]
+        
+        with self.db_lock:
+            if self.db is None:  # never opened, or closed by disconnect()
+                return
+            self.db.execute('BEGIN')
+            try:
+                self.db.executemany(INSERT_SQL, rows)
+                self.db.execute('COMMIT')
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+    
     def create_map_html(self, center_on_latest=True):
-        """Create interactive map HTML string"""
+        """Create interactive map HTML string
+        
+        Renders are cached per (data_version, center_on_latest), so every
+        /api/map request between two GPS updates shares a single render.
+        """
         with self.data_lock:
             if not self.gps_data:
                 return None
-            
+            data_version = self.data_version
+        return self._render_map(data_version, center_on_latest)
+    
+    def _render_map_impl(self, data_version, center_on_latest):
+        """Render the map HTML (data_version only serves as the cache key)"""
+        with self.data_lock:
             # Determine map center
             if center_on_latest and self.latest_positions:
                 # Center on most recent position
@@ -374,19 +762,113 @@ class GPSWebTracker:
                 zoom_start = 13
             else:
                 # Center on average of all points
-                all_points = []
-                for sender_points in self.gps_data.values():
-                    all_points.extend(sender_points)
-                
-                avg_lat = sum(p['lat'] for p in all_points) / len(all_points)
-                avg_lng = sum(p['lng'] for p in all_points) / len(all_points)
+                avg_lat = self.lat_sum / self.point_count
+                avg_lng = self.lng_sum / self.point_count
                 map_center = [avg_lat, avg_lng]
                 zoom_start = 10
             
-            # Create map
+            
+            # Snapshot the tracks so the slow render doesn't hold data_lock
+            tracks = [
+                (sender, self.sender_colors[sender], list(points))
+                for sender, points in self.gps_data.items()
+                if points
+            ]
+        
+        # Rows for TrackLayer
+        track_rows = []
+        markers = []
+        
+        # Process each sender
+        for sender, color, points in tracks:
+            # Points are stored in arrival order, which is normally time
+            # order; only pay for a sort when a linear scan says otherwise
+            sorted_points = list(points)
+            timestamps = [p.get('timestamp') or '' for p in sorted_points]
+            if any(a > b for a, b in zip(timestamps, islice(timestamps, 1, None))):
+                sorted_points.sort(key=lambda p: p.get('timestamp') or '')
+            
+            # Create path/track
+            if len(sorted_points) > 1:
+                track_coords = [[p['lat'], p['lng']] for p in sorted_points]
+                track_rows.append([sender, color, track_coords])
+            
+            # Add markers for key points
+            # Improved marker sampling: always show first, last, emergencies, and sample intermediates
+            n = len(sorted_points)
+            show_idx = set()
+            if n > 0:
+                show_idx.add(0)  # always show first
+                show_idx.add(n-1)  # always show last
+            # Always show emergencies
+            for i, point in enumerate(sorted_points):
+                if point.get('emergency') is True:
+                    show_idx.add(i)
+            # Sample intermediates if large
+            max_markers = 20
+            if n > max_markers:
+                step = max(1, n // (max_markers-2))
+                for i in range(1, n-1, step):
+                    show_idx.add(i)
+            for i, point in enumerate(sorted_points):
+                if i not in show_idx:
+                    continue
+                is_latest = (i == n-1)
+                is_emergency = point.get('emergency') is True
+                # Create popup content
+                popup_html = f"""
+                <b>Sender:</b> {point['sender']}<br>
+                <b>Position:</b> {point['lat']:.6f}, {point['lng']:.6f}<br>
+                <b>Time:</b> {point.get('timestamp', 'Unknown')}<br>
+                """
+                if point.get('speed') is not None:
+                    popup_html += f"<b>Speed:</b> {point['speed']:.1f} km/h<br>"
+                if point.get('course') is not None:
+                    popup_html += f"<b>Course:</b> {point['course']:.1f}°<br>"
+                if point.get('altitude') is not None:
+                    popup_html += f"<b>Altitude:</b> {point['altitude']:.1f} m<br>"
+                if point.get('satellites') is not None:
+                    popup_html += f"<b>Satellites:</b> {point['satellites']}<br>"
+                if point.get('protocol'):
+                    popup_html += f"<b>Protocol:</b> {point['protocol']}<br>"
+                # Choose marker icon and color
+                if is_emergency:
+                    marker_color, icon = 'red', 'exclamation-sign'
+                elif is_latest:
+                    marker_color, icon = color, 'record'
+                elif i == 0:
+                    marker_color, icon = color, 'flag'
+                else:
+                    marker_color, icon = color, 'circle'
+                markers.append([
+                    point['lat'], point['lng'], marker_color, icon, popup_html,
+                    f"{sender} - {point.get('timestamp', 'Unknown')}"
+                ])
+        
+        map_data = {
+            'center': map_center,
+            'zoom': zoom_start,
+            'tracks': track_rows,
+            'markers': markers
+        }
+        # The shell embeds the page in an iframe srcdoc, so the document is
+        # HTML-escaped just like the rest of the page around it
+        return self._map_shell().replace(
+            TrackLayer.DATA_PLACEHOLDER,
+            html.escape(str(htmlsafe_json_dumps(map_data)))
+        )
+    
+    def _map_shell(self):
+        """Map page without any GPS data, built on first use
+        
+        Base layers and controls are the same for every render; only the
+        TrackLayer data placeholder differs between renders.
+        """
+        if self._map_shell_html is None:
+            # View is set by TrackLayer from the render's map data
             m = folium.Map(
-                location=map_center,
-                zoom_start=zoom_start,
+                location=[0, 0],
+                zoom_start=2,
                 tiles='OpenStreetMap'
             )
             
@@ -423,94 +905,7 @@ class GPSWebTracker:
                 control=True
             ).add_to(m)
             
-            # Color scheme for different senders
-            colors = ['red', 'blue', 'green', 'purple', 'orange', 'darkred', 
-                     'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue', 
-                     'darkpurple', 'white', 'pink', 'lightblue', 'lightgreen', 
-                     'gray', 'black', 'lightgray']
-            
-            sender_colors = {}
-            color_idx = 0
-            
-            # Process each sender
-            for sender, points in self.gps_data.items():
-                if not points:
-                    continue
-                    
-                # Assign color to sender
-                if sender not in sender_colors:
-                    sender_colors[sender] = colors[color_idx % len(colors)]
-                    color_idx += 1
-                
-                color = sender_colors[sender]
-                
-                # Sort points by timestamp
-                sorted_points = sorted(points, key=lambda p: p.get('timestamp', ''))
-                
-                # Create path/track
-                if len(sorted_points) > 1:
-                    track_coords = [[p['lat'], p['lng']] for p in sorted_points]
-                    folium.PolyLine(
-                        track_coords,
-                        color=color,
-                        weight=3,
-                        opacity=0.7,
-                        popup=f"Track for {sender}"
-                    ).add_to(m)
-                
-                # Add markers for key points
-                # Improved marker sampling: always show first, last, emergencies, and sample intermediates
-                n = len(sorted_points)
-                show_idx = set()
-                if n > 0:
-                    show_idx.add(0)  # always show first
-                    show_idx.add(n-1)  # always show last
-                # Always show emergencies
-                for i, point in enumerate(sorted_points):
-                    if point.get('emergency') is True:
-                        show_idx.add(i)
-                # Sample intermediates if large
-                max_markers = 20
-                if n > max_markers:
-                    step = max(1, n // (max_markers-2))
-                    for i in range(1, n-1, step):
-                        show_idx.add(i)
-                for i, point in enumerate(sorted_points):
-                    if i not in show_idx:
-                        continue
-                    is_latest = (i == n-1)
-                    is_emergency = point.get('emergency') is True
-                    # Create popup content
-                    popup_html = f"""
-                    <b>Sender:</b> {point['sender']}<br>
-                    <b>Position:</b> {point['lat']:.6f}, {point['lng']:.6f}<br>
-                    <b>Time:</b> {point.get('timestamp', 'Unknown')}<br>
-                    """
-                    if point.get('speed') is not None:
-                        popup_html += f"<b>Speed:</b> {point['speed']:.1f} km/h<br>"
-                    if point.get('course') is not None:
-                        popup_html += f"<b>Course:</b> {point['course']:.1f}°<br>"
-                    if point.get('altitude') is not None:
-                        popup_html += f"<b>Altitude:</b> {point['altitude']:.1f} m<br>"
-                    if point.get('satellites') is not None:
-                        popup_html += f"<b>Satellites:</b> {point['satellites']}<br>"
-                    if point.get('protocol'):
-                        popup_html += f"<b>Protocol:</b> {point['protocol']}<br>"
-                    # Choose marker icon and color
-                    if is_emergency:
-                        icon = folium.Icon(color='red', icon='exclamation-sign', prefix='glyphicon')
-                    elif is_latest:
-                        icon = folium.Icon(color=color, icon='record', prefix='glyphicon')
-                    elif i == 0:
-                        icon = folium.Icon(color=color, icon='flag', prefix='glyphicon')
-                    else:
-                        icon = folium.Icon(color=color, icon='circle', prefix='glyphicon')
-                    folium.Marker(
-                        [point['lat'], point['lng']],
-                        popup=folium.Popup(popup_html, max_width=300),
-                        tooltip=f"{sender} - {point.get('timestamp', 'Unknown')}",
-                        icon=icon
-                    ).add_to(m)
+            TrackLayer().add_to(m)
             
             # Add layer control
             folium.LayerControl().add_to(m)
@@ -525,36 +920,52 @@ class GPSWebTracker:
             # Add measure control
             plugins.MeasureControl().add_to(m)
             
-            return m._repr_html_()
-    
+            self._map_shell_html = m._repr_html_()
+        return self._map_shell_html
+
     def listen(self):
         """Listen for incoming GPS data"""
         self.running = True
-        buffer = ""
+        buffer = bytearray()
+        offset = 0  # start of the unconsumed part of buffer
+        
+        # Preallocated receive buffer, reused for every recv call
+        chunk = bytearray(65536)
+        chunk_view = memoryview(chunk)
         
         try:
             while self.running and self.connected and self.socket:
                 try:
-                    data = self.socket.recv(8192).decode('utf-8', errors='ignore')
-                    if not data:
+                    received = self.socket.recv_into(chunk)
+                    if not received:
                         self.logger.warning("Connection closed by server")
                         break
                     
-                    buffer += data
+                    buffer += chunk_view[:received]
                     
                     # Process complete XML messages
-                    while '<data>' in buffer and '</data>' in buffer:
-                        start = buffer.find('<data>')
-                        end = buffer.find('</data>', start) + 7
+                    while True:
+                        start = buffer.find(b'<data>', offset)
+                        if start == -1:
+                            break
+                        end = buffer.find(b'</data>', start)
+                        if end == -1:
+                            break
+                        end += 7
                         
-                        if start != -1 and end > start:
-                            xml_message = buffer[start:end]
-                            buffer = buffer[end:]
-                            
-                            # Parse and store GPS data
-                            gps_points = self.parse_gps_data(xml_message)
-                            if gps_points:
-                                self.store_gps_data(gps_points)
+                        # ElementTree parses the UTF-8 bytes directly; no decode pass
+                        xml_message = bytes(buffer[start:end])
+                        offset = end
+                        
+                        # Parse and store GPS data
+                        gps_points = self.parse_gps_data(xml_message)
+                        if gps_points:
+                            self.store_gps_data(gps_points)
+                    
+                    # Drop consumed bytes in bulk instead of re-slicing per message
+                    if offset == len(buffer) or offset > 65536:
+                        del buffer[:offset]
+                        offset = 0
                 
                 except socket.timeout:
                     continue
@@ -568,29 +979,55 @@ class GPSWebTracker:
             self.connected = False
     
     def get_sender_summary(self):
-        """Get summary of all tracked senders"""
+        """Get summary of all tracked senders
+        
+        Summaries are kept up to date as points are stored, so this only
+        copies the current mapping.
+        """
         with self.data_lock:
-            summary = {}
-            for sender, points in self.gps_data.items():
-                if points:
-                    latest = points[-1]
-                    
-                    # Get altitude and trend information
-                    altitude_info = self._calculate_altitude_trend(points)
-                    
-                    summary[sender] = {
-                        'total_points': len(points),
-                        'latest_position': (latest['lat'], latest['lng']),
-                        'latest_time': latest.get('timestamp'),
-                        'emergency_active': latest.get('emergency', False),
-                        'altitude': altitude_info['current_altitude'],
-                        'altitude_trend': altitude_info['trend'],
-                        'altitude_change': altitude_info['change']
-                    }
-            return summary
-    
-    def _calculate_altitude_trend(self, points):
-        """Calculate altitude trend from recent GPS points"""
+            return dict(self.sender_summaries)
+    
+    def trend_all(self):
+        """Get the altitude trend of every tracked sender
+        
+        Read from the maintained summaries, so no trend is recomputed.
+        """
+        with self.data_lock:
+            return {
+                sender: _trend_of(summary)
+                for sender, summary in self.sender_summaries.items()
+            }
+    
+    def trend_for(self, sender):
+        """Get the altitude trend of one sender, or None if it is unknown"""
+        with self.data_lock:
+            summary = self.sender_summaries.get(sender)
+            return _trend_of(summary) if summary is not None else None
+    
+    def _summary_for(self, sender):
+        """Summarize one sender's points (caller holds data_lock)"""
+        points = self.gps_data[sender]
+        latest = points[-1]
+        
+        # Get altitude and trend information
+        altitude_info = self._calculate_altitude_trend(points, self._alt_window[sender])
+        
+        return {
+            'total_points': len(points),
+            'latest_position': (latest['lat'], latest['lng']),
+            'latest_time': latest.get('timestamp'),
+            'emergency_active': latest.get('emergency', False),
+            'altitude': altitude_info['current_altitude'],
+            'altitude_trend': altitude_info['trend'],
+            'altitude_change': altitude_info['change']
+        }
+    
+    def _calculate_altitude_trend(self, points, altitudes=None):
+        """Calculate altitude trend from recent GPS points
+        
+        altitudes is the sender's rolling window of recent altitude
+        readings; without it the window is rebuilt from points.
+        """
         # Default values
         result = {
             'current_altitude': None,
@@ -607,46 +1044,36 @@ class GPSWebTracker:
         if current_alt is not None:
             result['current_altitude'] = round(current_alt, 1)
         
-        # Need at least 2 points to determine trend
-        if len(points) < 2:
-            return result
-            
-        # Look at last 5 points or all points if fewer
-        recent_points = points[-5:] if len(points) >= 5 else points
-        altitudes = []
-        
-        for point in recent_points:
-            alt = point.get('altitude')
-            if alt is not None:
-                altitudes.append(alt)
+        if altitudes is None:
+            altitudes = _recent_altitudes(points)
         
         # Need at least 2 altitude readings to determine trend
         if len(altitudes) < 2:
             return result
             
-        # Calculate trend based on first and last altitudes in recent data
-        altitude_change = altitudes[-1] - altitudes[0]
+        # Least-squares change across the window, so one noisy reading at
+        # either end doesn't decide the trend on its own
+        altitude_change = altitudes.change()
         result['change'] = round(altitude_change, 1)
         
-        # Determine trend (use threshold to avoid noise)
-        threshold = 5.0  # meters
-        if altitude_change > threshold:
-            result['trend'] = 'rising'
-        elif altitude_change < -threshold:
-            result['trend'] = 'falling'
-        else:
-            result['trend'] = 'stable'
+        # Determine trend (use threshold to avoid noise); the comparisons
+        # give -1, 0 or 1, which index TREND_LABELS from the middle
+        trend = (altitude_change > TREND_THRESHOLD) - (altitude_change < -TREND_THRESHOLD)
+        result['trend'] = TREND_LABELS[trend + 1]
             
         return result
 
-# Global tracker instance
-tracker = None
-
 def create_app(tracker_instance):
     """Create Flask application"""
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'gps_tracker_secret_key'
-    socketio = SocketIO(app, cors_allowed_origins="*")
+    socketio_options = {'cors_allowed_origins': '*'}
+    if orjson is not None:
+        # Encode API responses and gps_update payloads in C rather than
+        # with the json module
+        app.json = OrjsonProvider(app)
+        socketio_options['json'] = OrjsonCodec
+    socketio = SocketIO(app, **socketio_options)
     
     # Store references
     tracker_instance.app = app
@@ -670,6 +1097,28 @@ def create_app(tracker_instance):
         """Get sender summary as JSON"""
         return jsonify(tracker_instance.get_sender_summary())
     
+    @app.route('/api/trends')
+    def get_trends():
+        """Get altitude trends of all senders as JSON"""
+        return jsonify(tracker_instance.trend_all())
+    
+    @app.route('/api/trends/<sender>')
+    def get_sender_trend(sender):
+        """Get one sender's altitude trend as JSON
+        
+        The body is filled into TREND_JSON rather than run through the
+        JSON encoder, as its shape never changes.
+        """
+        trend = tracker_instance.trend_for(sender)
+        if trend is None:
+            return jsonify({'error': f'Unknown sender: {sender}'}), 404
+        body = TREND_JSON % (
+            _json_number(trend['current_altitude']),
+            trend['trend'],
+            _json_number(trend['change'])
+        )
+        return app.response_class(body, mimetype='application/json')
+    
     @app.route('/api/status')
     def get_status():
         """Get connection status"""
@@ -697,6 +1146,7 @@ def create_app(tracker_instance):
 
 def main():
     """Main application entry point"""
+    tracker = None  # set once GPSWebTracker has been constructed
     try:
         # Validate configuration
         Config.validate()
@@ -707,7 +1157,6 @@ def main():
         if Config.TARGET_SENDER:
             print(f"Target Sender: {Config.TARGET_SENDER}")
         print("=" * 50)
-        global tracker
         tracker = GPSWebTracker()
         # Create Flask app
         app, socketio = create_app(tracker)
@@ -732,21 +1181,21 @@ def main():
         # Start web server
         socketio.run(app, host=Config.WEB_HOST, port=Config.WEB_PORT, debug=False, log_output=False)
     except KeyboardInterrupt:
-        if 'tracker' in globals() and tracker and hasattr(tracker, 'logger'):
+        if tracker is not None:
             tracker.logger.info("Shutting down (KeyboardInterrupt)...")
         print("\n🛑 Shutting down...")
     except ValueError as e:
-        if 'tracker' in globals() and tracker and hasattr(tracker, 'logger'):
+        if tracker is not None:
             tracker.logger.error(f"Configuration error: {e}")
         print(f"❌ Configuration error: {e}")
         sys.exit(1)
     except Exception as e:
-        if 'tracker' in globals() and tracker and hasattr(tracker, 'logger'):
+        if tracker is not None:
             tracker.logger.error(f"Application error: {e}")
         print(f"❌ Application error: {e}")
         sys.exit(1)
     finally:
-        if 'tracker' in globals() and tracker:
+        if tracker is not None:
             tracker.disconnect()
             print("✓ Disconnected from GPS server")
 
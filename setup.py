@@ -3,8 +3,7 @@
 Setup script for GPS Web Tracker
 """
 
-from setuptools import setup, find_packages
-import os
+from setuptools import setup
 
 # Read the README file
 def read_readme():
@@ -24,7 +23,8 @@ setup(
     long_description=read_readme(),
     long_description_content_type="text/markdown",
     url="https://github.com/yourusername/gps-web-tracker",
-    packages=find_packages(),
+    # Top-level modules rather than a package, so list them directly
+    py_modules=["cli", "config", "gps_web_tracker"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -50,6 +50,9 @@ setup(
         "": ["templates/*.html", "*.md", "requirements.txt"],
     },
     extras_require={
+        "speedups": [
+            "orjson>=3.8",
+        ],
         "dev": [
             "pytest>=6.0",
             "pytest-cov>=2.0",
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Make the top-level modules (cli, config, gps_web_tracker) importable
+# without installing the project
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
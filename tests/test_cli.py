@@ -0,0 +1,50 @@
+
+import pytest
+from cli import create_parser
+
+def _parse(argv):
+    """Parse argv with the lazily built parser and with the full one"""
+    return create_parser(argv).parse_args(argv), create_parser().parse_args(argv)
+
+@pytest.mark.parametrize('argv', [
+    ['--gps-p', '1'],
+    ['--web-port=8000'],
+    ['--gps-host', 'example.com', '--log-level', 'DEBUG'],
+    ['--max-p=50', '--target-sender', '300234010000000'],
+])
+def test_lazy_parser_matches_full_parser(argv):
+    lazy, full = _parse(argv)
+    assert vars(lazy) == vars(full)
+
+def test_skipped_groups_default_to_none():
+    args = create_parser(['--gps-port', '1']).parse_args(['--gps-port', '1'])
+    assert args.gps_port == 1
+    assert args.gps_host is None
+    assert args.web_host is None and args.web_port is None
+    assert args.target_sender is None and args.max_points is None and args.log_level is None
+
+@pytest.mark.parametrize('argv', [['-h'], ['--he']])
+def test_help_builds_every_group(argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        create_parser(argv).parse_args(argv)
+    assert exc.value.code == 0
+    help_text = capsys.readouterr().out
+    for option in ('--gps-host', '--web-port', '--log-level'):
+        assert option in help_text
+
+@pytest.mark.parametrize('argv', [['--gps', 'x'], ['--log-level', 'TRACE'], ['--bogus']])
+def test_lazy_parser_rejects_what_full_parser_rejects(argv, capsys):
+    for parser in (create_parser(argv), create_parser()):
+        with pytest.raises(SystemExit) as exc:
+            parser.parse_args(argv)
+        assert exc.value.code == 2
+
+def test_ambiguous_prefix_is_reported(capsys):
+    with pytest.raises(SystemExit):
+        create_parser(['--gps', 'x']).parse_args(['--gps', 'x'])
+    assert 'ambiguous option: --gps' in capsys.readouterr().err
+
+def test_invalid_log_level_lists_choices_in_fixed_order(capsys):
+    with pytest.raises(SystemExit):
+        create_parser(['--log-level', 'TRACE']).parse_args(['--log-level', 'TRACE'])
+    assert "(choose from 'DEBUG', 'INFO', 'WARNING', 'ERROR')" in capsys.readouterr().err
@@ -1,8 +1,5 @@
 
-import sys
-import os
 import pytest
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import Config
 
 def test_config_validation():
@@ -1,12 +1,18 @@
 
-import sys
-import os
+import json
+import sqlite3
 import pytest
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from gps_web_tracker import GPSWebTracker
+from config import Config
+from gps_web_tracker import AltitudeWindow, GPSWebTracker, create_app, _json_number
 
-def test_calculate_altitude_trend_stable():
+@pytest.fixture(scope="module")
+def tracker():
+    # None of these tests store points, so they can share one tracker
     tracker = GPSWebTracker()
+    yield tracker
+    tracker.disconnect()
+
+def test_calculate_altitude_trend_stable(tracker):
     points = [
         {'altitude': 500.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:00:00'},
         {'altitude': 502.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:01:00'},
@@ -16,8 +22,7 @@ def test_calculate_altitude_trend_stable():
     assert result['trend'] == 'stable'
     assert result['current_altitude'] == 498.0
 
-def test_calculate_altitude_trend_rising():
-    tracker = GPSWebTracker()
+def test_calculate_altitude_trend_rising(tracker):
     points = [
         {'altitude': 100.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:00:00'},
         {'altitude': 110.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:01:00'},
@@ -27,8 +32,7 @@ def test_calculate_altitude_trend_rising():
     assert result['trend'] == 'rising'
     assert result['current_altitude'] == 120.0
 
-def test_calculate_altitude_trend_falling():
-    tracker = GPSWebTracker()
+def test_calculate_altitude_trend_falling(tracker):
     points = [
         {'altitude': 200.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:00:00'},
         {'altitude': 190.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:01:00'},
@@ -37,3 +41,215 @@ def test_calculate_altitude_trend_falling():
     result = tracker._calculate_altitude_trend(points)
     assert result['trend'] == 'falling'
     assert result['current_altitude'] == 180.0
+
+def test_parse_gps_data_single_point_report(tracker):
+    xml = (
+        '<data><meta><sender type="IMEI">300234010000000</sender>'
+        '<time>2025-09-02T10:00:00</time><protocol>NAL</protocol></meta>'
+        '<nalGpsReport5><lat>34.5</lat><lng>-118.25</lng><alt>1200.5</alt>'
+        '<gndVel>12.0</gndVel><sats>8</sats><emer>1</emer><fix>3D</fix></nalGpsReport5></data>'
+    )
+    points = tracker.parse_gps_data(xml)
+    assert len(points) == 1
+    point = points[0]
+    assert point['sender'] == '300234010000000'
+    assert point['sender_type'] == 'IMEI'
+    assert (point['lat'], point['lng']) == (34.5, -118.25)
+    assert point['altitude'] == 1200.5
+    assert point['speed'] == 12.0
+    assert point['satellites'] == 8
+    assert point['emergency'] is True
+    assert point['fix_type'] == '3D'
+    assert point['protocol'] == 'NAL'
+
+def test_parse_gps_data_multi_point_report_skips_invalid_points(tracker):
+    xml = (
+        '<data><meta><sender>300234010000000</sender><time>2025-09-02T10:00:00</time></meta>'
+        '<nalGpsReport4>'
+        '<point><lat>34.0</lat><lng>-118.0</lng></point>'
+        '<point><lat>95.0</lat><lng>-118.0</lng></point>'
+        '<point><lat>34.1</lat><lng>-118.1</lng><alt>bad</alt></point>'
+        '</nalGpsReport4></data>'
+    )
+    points = tracker.parse_gps_data(xml)
+    assert [(p['lat'], p['lng']) for p in points] == [(34.0, -118.0), (34.1, -118.1)]
+    assert 'altitude' not in points[1]
+
+def test_altitude_window_matches_fresh_window_after_eviction():
+    window = AltitudeWindow()
+    for altitude in (900.0, 100.0, 110.0, 125.0, 118.0, 140.0, 150.0):
+        window.append(altitude)
+    fresh = AltitudeWindow((110.0, 125.0, 118.0, 140.0, 150.0))
+    assert len(window) == 5
+    assert window.change() == pytest.approx(fresh.change())
+    assert window.change() == pytest.approx(40.8)
+
+def test_calculate_altitude_trend_ignores_single_spike(tracker):
+    points = [
+        {'altitude': 500.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:00:00'},
+        {'altitude': 560.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:01:00'},
+        {'altitude': 500.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:02:00'},
+        {'altitude': 500.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:03:00'},
+        {'altitude': 500.0, 'lat': 34.0, 'lng': -118.0, 'timestamp': '2025-09-02T10:04:00'}
+    ]
+    result = tracker._calculate_altitude_trend(points)
+    assert result['trend'] == 'stable'
+    assert result['change'] == 0.0
+
+def _report(sender, lat, time='<time>2025-09-02T10:00:00</time>'):
+    return (
+        f'<data><meta><sender>{sender}</sender>{time}</meta>'
+        f'<nalGpsReport5><lat>{lat}</lat><lng>-118.0</lng></nalGpsReport5></data>'
+    )
+
+def test_rejected_batch_does_not_lose_other_batches(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'gps.db')
+    monkeypatch.setattr(Config, 'DATABASE_PATH', db_path)
+    tracker = GPSWebTracker()
+    for i in range(5):
+        tracker.store_gps_data(tracker.parse_gps_data(_report(f'sender{i}', 34.0 + i)))
+    # No <time> leaves timestamp None, which the NOT NULL column rejects
+    tracker.store_gps_data(tracker.parse_gps_data(_report('bad', 30.0, time='')))
+    tracker.disconnect()
+    assert tracker.db is None
+    # Closing the last connection checkpoints and removes the WAL file
+    assert not (tmp_path / 'gps.db-wal').exists()
+    
+    with sqlite3.connect(db_path) as conn:
+        senders = [row[0] for row in conn.execute('SELECT sender FROM gps_points ORDER BY sender')]
+    assert senders == [f'sender{i}' for i in range(5)]
+
+def test_non_finite_altitude_does_not_corrupt_trend(tracker):
+    xml = (
+        '<data><meta><sender>300234010000000</sender><time>2025-09-02T10:00:00</time></meta>'
+        '<nalGpsReport5><lat>34.0</lat><lng>-118.0</lng><alt>inf</alt></nalGpsReport5></data>'
+    )
+    assert 'altitude' not in tracker.parse_gps_data(xml)[0]
+    
+    window = AltitudeWindow([float('inf'), float('nan')])
+    for altitude in range(100, 200, 10):
+        window.append(float(altitude))
+    assert len(window) == 5
+    assert window.change() == pytest.approx(40.0)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / 'gps.db'))
+    tracker = GPSWebTracker()
+    app, _ = create_app(tracker)
+    tracker.store_gps_data([
+        {'sender': 'climber', 'lat': 34.0, 'lng': -118.0, 'altitude': altitude,
+         'timestamp': f'2025-09-02T10:0{i}:00'}
+        for i, altitude in enumerate((100.0, 110.0, 120.0))
+    ])
+    tracker.store_gps_data([
+        {'sender': 'no-altitude', 'lat': 35.0, 'lng': -117.0, 'timestamp': '2025-09-02T10:00:00'}
+    ])
+    yield app.test_client()
+    tracker.disconnect()
+
+def test_sender_trend_endpoint(client):
+    response = client.get('/api/trends/climber')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data) == {'current_altitude': 120.0, 'trend': 'rising', 'change': 20.0}
+
+def test_sender_trend_endpoint_without_altitude(client):
+    response = client.get('/api/trends/no-altitude')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'current_altitude': None, 'trend': 'stable', 'change': 0.0}
+    assert _json_number(None) == _json_number(float('nan')) == 'null'
+
+def test_sender_trend_endpoint_unknown_sender(client):
+    response = client.get('/api/trends/nobody')
+    assert response.status_code == 404
+    assert 'error' in json.loads(response.data)
+
+def test_trends_endpoint(client):
+    response = client.get('/api/trends')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {
+        'climber': {'current_altitude': 120.0, 'trend': 'rising', 'change': 20.0},
+        'no-altitude': {'current_altitude': None, 'trend': 'stable', 'change': 0.0}
+    }
+
+def test_group_commit_error_falls_back_to_single_batches(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'gps.db')
+    monkeypatch.setattr(Config, 'DATABASE_PATH', db_path)
+    tracker = GPSWebTracker()
+    insert_points = tracker._insert_points
+    failed = []
+    
+    def insert_or_fail_group(points):
+        if len(points) > 1 and not failed:
+            failed.append(len(points))
+            raise sqlite3.OperationalError('database is locked')
+        insert_points(points)
+    monkeypatch.setattr(tracker, '_insert_points', insert_or_fail_group)
+    
+    # Queue all three batches before the writer starts, so they form one group
+    batches = [tracker.parse_gps_data(_report(f'sender{i}', 34.0 + i)) for i in range(3)]
+    for batch in batches[:-1]:
+        tracker.write_queue.put(batch)
+    tracker._queue_for_database(batches[-1])
+    tracker.store_gps_data(tracker.parse_gps_data(_report('later', 40.0)))
+    tracker.disconnect()
+    
+    assert len(failed) == 1 and failed[0] >= 3
+    with sqlite3.connect(db_path) as conn:
+        senders = [row[0] for row in conn.execute('SELECT sender FROM gps_points ORDER BY sender')]
+    assert senders == ['later', 'sender0', 'sender1', 'sender2']
+
+class ScriptedSocket:
+    """Socket stand-in whose recv_into returns scripted chunks, then b''"""
+    
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+    
+    def recv_into(self, buffer):
+        if not self.chunks:
+            return 0
+        data = self.chunks.pop(0)
+        if len(data) > len(buffer):
+            self.chunks.insert(0, data[len(buffer):])
+            data = data[:len(buffer)]
+        buffer[:len(data)] = data
+        return len(data)
+
+def _listen_to(chunks, tmp_path, monkeypatch):
+    """Run listen() over scripted chunks and return the senders it stored"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / 'gps.db'))
+    tracker = GPSWebTracker()
+    stored = []
+    monkeypatch.setattr(tracker, 'store_gps_data',
+                        lambda points: stored.extend(p['sender'] for p in points))
+    tracker.socket = ScriptedSocket(chunks)
+    tracker.connected = True
+    tracker.listen()
+    assert tracker.connected is False  # the zero-byte read ended the loop
+    tracker.socket = None
+    tracker.disconnect()
+    return stored
+
+def test_listen_joins_message_split_across_reads(tmp_path, monkeypatch):
+    message = _report('split', 34.0).encode()
+    chunks = [message[:20], message[20:]]
+    assert _listen_to(chunks, tmp_path, monkeypatch) == ['split']
+
+def test_listen_handles_several_messages_in_one_read(tmp_path, monkeypatch):
+    chunks = [b''.join(_report(f'sender{i}', 34.0 + i).encode() for i in range(3))]
+    assert _listen_to(chunks, tmp_path, monkeypatch) == ['sender0', 'sender1', 'sender2']
+
+def test_listen_skips_stray_closing_tag(tmp_path, monkeypatch):
+    chunks = [b'</data>noise' + _report('after', 34.0).encode()]
+    assert _listen_to(chunks, tmp_path, monkeypatch) == ['after']
+
+def test_listen_keeps_partial_message_when_compacting(tmp_path, monkeypatch):
+    # Enough whole messages to move the consumed offset past 64 KiB,
+    # followed by a message cut off mid-way
+    messages = [_report(f'sender{i}', 34.0).encode() for i in range(700)]
+    assert sum(map(len, messages)) > 65536
+    last = _report('last', 35.0).encode()
+    chunks = [b''.join(messages) + last[:30], last[30:]]
+    stored = _listen_to(chunks, tmp_path, monkeypatch)
+    assert stored == [f'sender{i}' for i in range(700)] + ['last']